@@ -3,24 +3,33 @@
 import os
 import sys
 # single thread doubles cuda performance - needs to be set before torch import
-if any(arg.startswith('--execution-provider') for arg in sys.argv):
-    os.environ['OMP_NUM_THREADS'] = '1'
+if '--execution-provider' in sys.argv or any(arg.startswith('--execution-provider=') for arg in sys.argv):
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
 # reduce tensorflow log level
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 import warnings
-from typing import List
+from collections import deque
+from queue import Queue
+from typing import Any, Deque, List
 import platform
 import signal
 import shutil
+import threading
 import argparse
 import onnxruntime
 import tensorflow
+from tqdm import tqdm
 import roop.globals
 import roop.metadata
 import roop.ui as ui
+from roop.capturer import get_video_frame
+from roop.face_analyser import get_one_face, get_source_face
+from roop.face_reference import get_face_reference, set_face_reference
 from roop.predictor import predict_image, predict_video
-from roop.processors.frame.core import get_frame_processors_modules
-from roop.utilities import has_image_extension, is_image, is_video, detect_fps, create_video, extract_frames, get_temp_frame_paths, restore_audio, create_temp, move_temp, clean_temp, normalize_output_path
+from roop.processors.frame.core import get_executor, get_frame_processors_modules, suggest_batch_size
+from roop.utilities import has_image_extension, is_image, is_video, detect_fps, create_video, extract_frames, get_temp_frame_paths, get_video_resolution, iter_raw_frames, open_video_writer, restore_audio, create_temp, move_temp, clean_temp, normalize_output_path
+
+PLATFORM_NAME = platform.system().lower()
 
 warnings.filterwarnings('ignore', category=FutureWarning, module='insightface')
 warnings.filterwarnings('ignore', category=UserWarning, module='torchvision')
@@ -42,7 +51,7 @@ def parse_args() -> None:
     program.add_argument('--similar-face-distance', help='face distance used for recognition', dest='similar_face_distance', type=float, default=0.85)
     program.add_argument('--temp-frame-format', help='image format used for frame extraction', dest='temp_frame_format', default='png', choices=['jpg', 'png'])
     program.add_argument('--temp-frame-quality', help='image quality used for frame extraction', dest='temp_frame_quality', type=int, default=0, choices=range(101), metavar='[0-100]')
-    program.add_argument('--output-video-encoder', help='encoder used for the output video', dest='output_video_encoder', default='libx264', choices=['libx264', 'libx265', 'libvpx-vp9', 'h264_nvenc', 'hevc_nvenc'])
+    program.add_argument('--output-video-encoder', help='encoder used for the output video (default: libx264, nvenc when available)', dest='output_video_encoder', default=None, choices=['libx264', 'libx265', 'libvpx-vp9', 'h264_nvenc', 'hevc_nvenc'])
     program.add_argument('--output-video-quality', help='quality used for the output video', dest='output_video_quality', type=int, default=35, choices=range(101), metavar='[0-100]')
     program.add_argument('--max-memory', help='maximum amount of RAM in GB', dest='max_memory', type=int)
     program.add_argument('--execution-provider', help='available execution provider (choices: cpu, ...)', dest='execution_provider', default=['cpu'], choices=suggest_execution_providers(), nargs='+')
@@ -101,9 +110,9 @@ def limit_resources() -> None:
     # limit memory usage
     if roop.globals.max_memory:
         memory = roop.globals.max_memory * 1024 ** 3
-        if platform.system().lower() == 'darwin':
+        if PLATFORM_NAME == 'darwin':
             memory = roop.globals.max_memory * 1024 ** 6
-        if platform.system().lower() == 'windows':
+        if PLATFORM_NAME == 'windows':
             import ctypes
             kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
             kernel32.SetProcessWorkingSetSize(-1, ctypes.c_size_t(memory), ctypes.c_size_t(memory))
@@ -151,34 +160,32 @@ def start() -> None:
     # process image to videos
     if predict_video(roop.globals.target_path):
         destroy()
+    fps = detect_fps(roop.globals.target_path) if roop.globals.keep_fps else 30
     update_status('Creating temporary resources...')
     create_temp(roop.globals.target_path)
-    # extract frames
-    if roop.globals.keep_fps:
-        fps = detect_fps(roop.globals.target_path)
+    if roop.globals.keep_frames:
+        # extract frames
         update_status(f'Extracting frames with {fps} FPS...')
         extract_frames(roop.globals.target_path, fps)
-    else:
-        update_status('Extracting frames with 30 FPS...')
-        extract_frames(roop.globals.target_path)
-    # process frame
-    temp_frame_paths = get_temp_frame_paths(roop.globals.target_path)
-    if temp_frame_paths:
-        for frame_processor in get_frame_processors_modules(roop.globals.frame_processors):
-            update_status('Progressing...', frame_processor.NAME)
-            frame_processor.process_video(roop.globals.source_path, temp_frame_paths)
-            frame_processor.post_process()
-    else:
-        update_status('Frames not found...')
-        return
-    # create video
-    if roop.globals.keep_fps:
-        fps = detect_fps(roop.globals.target_path)
+        # process frame
+        temp_frame_paths = get_temp_frame_paths(roop.globals.target_path)
+        if temp_frame_paths:
+            for frame_processor in get_frame_processors_modules(roop.globals.frame_processors):
+                update_status('Progressing...', frame_processor.NAME)
+                frame_processor.process_video(roop.globals.source_path, temp_frame_paths)
+                frame_processor.post_process()
+        else:
+            update_status('Frames not found...')
+            return
+        # create video
         update_status(f'Creating video with {fps} FPS...')
         create_video(roop.globals.target_path, fps)
     else:
-        update_status('Creating video with 30 FPS...')
-        create_video(roop.globals.target_path)
+        # stream frames through the processors without a temp image round trip
+        update_status(f'Streaming frames with {fps} FPS...')
+        process_video_stream(fps)
+        for frame_processor in get_frame_processors_modules(roop.globals.frame_processors):
+            frame_processor.post_process()
     # handle audio
     if roop.globals.skip_audio:
         move_temp(roop.globals.target_path, roop.globals.output_path)
@@ -199,6 +206,73 @@ def start() -> None:
         update_status('Processing to video failed!')
 
 
+def process_video_stream(fps: float) -> None:
+    frame_processors = get_frame_processors_modules(roop.globals.frame_processors)
+    source_face = get_source_face(roop.globals.source_path) if roop.globals.source_path else None
+    reference_face = None
+    if not roop.globals.many_faces:
+        if not get_face_reference():
+            reference_frame = get_video_frame(roop.globals.target_path, roop.globals.reference_frame_number)
+            set_face_reference(get_one_face(reference_frame, roop.globals.reference_face_position))
+        reference_face = get_face_reference()
+    width, height = get_video_resolution(roop.globals.target_path)
+    batch_size = suggest_batch_size()
+    writer = open_video_writer(roop.globals.target_path, width, height, fps)
+    # prefetch decoded frames on a thread so decode overlaps inference
+    frame_queue: Queue[Any] = Queue(maxsize=batch_size * 2)
+
+    read_errors: List[Exception] = []
+
+    def read_frames() -> None:
+        try:
+            for temp_frame in iter_raw_frames(roop.globals.target_path, fps):
+                frame_queue.put(temp_frame)
+        except Exception as exception:
+            read_errors.append(exception)
+        finally:
+            # always deliver the sentinel so the batch loop cannot block forever
+            frame_queue.put(None)
+
+    def process_batch(temp_frames: List[Any]) -> List[Any]:
+        for frame_processor in frame_processors:
+            temp_frames = frame_processor.process_frame_batch(source_face, reference_face, temp_frames)
+        return temp_frames
+
+    reader = threading.Thread(target=read_frames, daemon=True)
+    reader.start()
+    progress_bar_format = '{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}{postfix}]'
+    with tqdm(desc='Processing', unit='frame', dynamic_ncols=True, bar_format=progress_bar_format) as progress:
+
+        def write_frames(temp_frames: List[Any]) -> None:
+            for temp_frame in temp_frames:
+                writer.stdin.write(temp_frame.tobytes())
+                progress.update(1)
+
+        # batches run on the worker pool; the fifo of futures preserves frame order
+        pending: Deque[Any] = deque()
+        max_pending = roop.globals.execution_threads + 2
+        temp_frames = []
+        while True:
+            temp_frame = frame_queue.get()
+            if temp_frame is None:
+                break
+            temp_frames.append(temp_frame)
+            if len(temp_frames) == batch_size:
+                pending.append(get_executor().submit(process_batch, temp_frames))
+                temp_frames = []
+                if len(pending) == max_pending:
+                    write_frames(pending.popleft().result())
+        if temp_frames:
+            pending.append(get_executor().submit(process_batch, temp_frames))
+        while pending:
+            write_frames(pending.popleft().result())
+    writer.stdin.close()
+    writer.wait()
+    reader.join()
+    if read_errors:
+        raise read_errors[0]
+
+
 def destroy() -> None:
     if roop.globals.target_path:
         clean_temp(roop.globals.target_path)
@@ -1,5 +1,7 @@
+import os
 import threading
 from typing import Any, Optional, List
+import cv2
 import insightface
 import numpy
 
@@ -8,6 +10,9 @@ from roop.typing import Frame, Face
 
 FACE_ANALYSER = None
 THREAD_LOCK = threading.Lock()
+SOURCE_FACE = None
+SOURCE_FACE_PATH = None
+SOURCE_FACE_MTIME = None
 
 
 def get_face_analyser() -> Any:
@@ -26,6 +31,17 @@ def clear_face_analyser() -> Any:
     FACE_ANALYSER = None
 
 
+def get_source_face(source_path: str) -> Optional[Face]:
+    global SOURCE_FACE, SOURCE_FACE_PATH, SOURCE_FACE_MTIME
+
+    source_mtime = os.path.getmtime(source_path) if os.path.isfile(source_path) else None
+    if source_path != SOURCE_FACE_PATH or source_mtime != SOURCE_FACE_MTIME:
+        SOURCE_FACE = get_one_face(cv2.imread(source_path))
+        SOURCE_FACE_PATH = source_path
+        SOURCE_FACE_MTIME = source_mtime
+    return SOURCE_FACE
+
+
 def get_one_face(frame: Frame, position: int = 0) -> Optional[Face]:
     many_faces = get_many_faces(frame)
     if many_faces:
@@ -1,4 +1,6 @@
 import threading
+from typing import List
+import cv2
 import numpy
 import opennsfw2
 from PIL import Image
@@ -9,6 +11,7 @@ from roop.typing import Frame
 PREDICTOR = None
 THREAD_LOCK = threading.Lock()
 MAX_PROBABILITY = 999999.85
+FRAME_INTERVAL = 100
 
 
 def get_predictor() -> Model:
@@ -26,18 +29,46 @@ def clear_predictor() -> None:
     PREDICTOR = None
 
 
+def predict_views(views: List[numpy.ndarray]) -> bool:
+    if not views:
+        return False
+    predictions = get_predictor().predict(numpy.stack(views))
+    return any(probability > MAX_PROBABILITY for _, probability in predictions)
+
+
 def predict_frame(target_frame: Frame) -> bool:
     image = Image.fromarray(target_frame)
-    image = opennsfw2.preprocess_image(image, opennsfw2.Preprocessing.YAHOO)
-    views = numpy.expand_dims(image, axis=0)
-    _, probability = get_predictor().predict(views)[0]
-    return probability > MAX_PROBABILITY
+    return predict_views([opennsfw2.preprocess_image(image, opennsfw2.Preprocessing.YAHOO)])
 
 
 def predict_image(target_path: str) -> bool:
-    return opennsfw2.predict_image(target_path) > MAX_PROBABILITY
+    return predict_views([opennsfw2.preprocess_image(Image.open(target_path), opennsfw2.Preprocessing.YAHOO)])
+
+
+def preprocess_frame(frame: Frame) -> numpy.ndarray:
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return opennsfw2.preprocess_image(Image.fromarray(frame), opennsfw2.Preprocessing.YAHOO)
 
 
 def predict_video(target_path: str) -> bool:
-    _, probabilities = opennsfw2.predict_video_frames(video_path=target_path, frame_interval=100)
-    return any(probability > MAX_PROBABILITY for probability in probabilities)
+    # seek straight to the sampled frames instead of decoding the whole video
+    capture = cv2.VideoCapture(target_path)
+    video_frame_total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    views = []
+    if video_frame_total > 0:
+        for frame_number in range(0, video_frame_total, FRAME_INTERVAL):
+            capture.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            has_frame, frame = capture.read()
+            if has_frame:
+                views.append(preprocess_frame(frame))
+    else:
+        # frame count is unreliable (live or vfr streams) - walk the stream instead
+        frame_number = 0
+        while capture.grab():
+            if frame_number % FRAME_INTERVAL == 0:
+                has_frame, frame = capture.retrieve()
+                if has_frame:
+                    views.append(preprocess_frame(frame))
+            frame_number += 1
+    capture.release()
+    return predict_views(views)
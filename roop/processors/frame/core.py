@@ -1,20 +1,28 @@
 import os
 import sys
+import atexit
 import importlib
+import threading
+import cv2
 import psutil
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
+from queue import Empty, Full, Queue
 from types import ModuleType
-from typing import Any, List, Callable
+from typing import Any, List, Callable, Optional
 from tqdm import tqdm
 
 import roop
+from roop.typing import Frame
 
+PROCESS = psutil.Process(os.getpid())
+EXECUTOR: Optional[ThreadPoolExecutor] = None
+EXECUTOR_LOCK = threading.Lock()
 FRAME_PROCESSORS_MODULES: List[ModuleType] = []
 FRAME_PROCESSORS_INTERFACE = [
     'pre_check',
     'pre_start',
     'process_frame',
+    'process_frame_batch',
     'process_frames',
     'process_image',
     'process_video',
@@ -22,6 +30,10 @@ FRAME_PROCESSORS_INTERFACE = [
 ]
 
 
+def suggest_batch_size() -> int:
+    return min(32, max(1, roop.globals.execution_threads * 8))
+
+
 def load_frame_processor_module(frame_processor: str) -> Any:
     try:
         frame_processor_module = importlib.import_module(f'roop.processors.frame.{frame_processor}')
@@ -45,43 +57,120 @@ def get_frame_processors_modules(frame_processors: List[str]) -> List[ModuleType
     return FRAME_PROCESSORS_MODULES
 
 
-def multi_process_frame(source_path: str, temp_frame_paths: List[str], process_frames: Callable[[str, List[str], Any], None], update: Callable[[], None]) -> None:
-    with ThreadPoolExecutor(max_workers=roop.globals.execution_threads) as executor:
-        futures = []
-        queue = create_queue(temp_frame_paths)
-        queue_per_future = max(len(temp_frame_paths) // roop.globals.execution_threads, 1)
-        while not queue.empty():
-            future = executor.submit(process_frames, source_path, pick_queue(queue, queue_per_future), update)
-            futures.append(future)
+def get_executor() -> ThreadPoolExecutor:
+    global EXECUTOR
+
+    with EXECUTOR_LOCK:
+        if EXECUTOR is None:
+            # avoid thread oversubscription between opencv and the worker pool;
+            # set here so single-threaded paths keep full opencv threading
+            if roop.globals.execution_threads and roop.globals.execution_threads > 1:
+                cv2.setNumThreads(max(1, (os.cpu_count() or 1) // roop.globals.execution_threads))
+            # workers stay alive for the whole process so per-task setup is paid once
+            EXECUTOR = ThreadPoolExecutor(max_workers=roop.globals.execution_threads, thread_name_prefix='roop')
+            atexit.register(shutdown_executor)
+    return EXECUTOR
+
+
+def shutdown_executor() -> None:
+    global EXECUTOR
+
+    with EXECUTOR_LOCK:
+        if EXECUTOR is not None:
+            EXECUTOR.shutdown(wait=False)
+            EXECUTOR = None
+
+
+def pipeline_frames(temp_frame_paths: List[str], process_frame_batch: Callable[[List[Frame]], List[Frame]], update: Callable[[], None], batch_size: int = 1) -> None:
+    queue_size = max(2, roop.globals.execution_threads * 4 // batch_size)
+    frame_queue: Queue[Any] = Queue(maxsize=queue_size)
+    result_queue: Queue[Any] = Queue(maxsize=queue_size)
+    error = threading.Event()
+
+    def put_queue(queue: Queue[Any], item: Any) -> None:
+        while not error.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def get_queue(queue: Queue[Any]) -> Any:
+        while not error.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+        return None
+
+    read_errors: List[Exception] = []
+
+    def read_frames() -> None:
+        try:
+            for index in range(0, len(temp_frame_paths), batch_size):
+                if error.is_set():
+                    return
+                batch_paths = temp_frame_paths[index:index + batch_size]
+                put_queue(frame_queue, (batch_paths, [cv2.imread(batch_path) for batch_path in batch_paths]))
+        except Exception as exception:
+            error.set()
+            read_errors.append(exception)
+        finally:
+            # always deliver the sentinels so workers cannot block forever
+            for _ in range(roop.globals.execution_threads):
+                put_queue(frame_queue, None)
+
+    def process_queued_frames() -> None:
+        while True:
+            item = get_queue(frame_queue)
+            if item is None:
+                return
+            batch_paths, temp_frames = item
+            try:
+                put_queue(result_queue, (batch_paths, process_frame_batch(temp_frames)))
+            except Exception:
+                error.set()
+                raise
+
+    def write_frames() -> None:
+        while True:
+            item = get_queue(result_queue)
+            if item is None:
+                return
+            batch_paths, temp_frames = item
+            for batch_path, temp_frame in zip(batch_paths, temp_frames):
+                cv2.imwrite(batch_path, temp_frame)
+                if update:
+                    update()
+
+    reader = threading.Thread(target=read_frames, daemon=True)
+    writer = threading.Thread(target=write_frames, daemon=True)
+    reader.start()
+    writer.start()
+    futures = [get_executor().submit(process_queued_frames) for _ in range(roop.globals.execution_threads)]
+    try:
         for future in as_completed(futures):
             future.result()
-
-
-def create_queue(temp_frame_paths: List[str]) -> Queue[str]:
-    queue: Queue[str] = Queue()
-    for frame_path in temp_frame_paths:
-        queue.put(frame_path)
-    return queue
-
-
-def pick_queue(queue: Queue[str], queue_per_future: int) -> List[str]:
-    queues = []
-    for _ in range(queue_per_future):
-        if not queue.empty():
-            queues.append(queue.get())
-    return queues
+        put_queue(result_queue, None)
+    except Exception:
+        error.set()
+        raise
+    finally:
+        reader.join()
+        writer.join()
+    if read_errors:
+        raise read_errors[0]
 
 
 def process_video(source_path: str, frame_paths: list[str], process_frames: Callable[[str, List[str], Any], None]) -> None:
     progress_bar_format = '{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}{postfix}]'
     total = len(frame_paths)
     with tqdm(total=total, desc='Processing', unit='frame', dynamic_ncols=True, bar_format=progress_bar_format) as progress:
-        multi_process_frame(source_path, frame_paths, process_frames, lambda: update_progress(progress))
+        process_frames(source_path, frame_paths, lambda: update_progress(progress))
 
 
 def update_progress(progress: Any = None) -> None:
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / 1024 / 1024 / 1024
+    memory_usage = PROCESS.memory_info().rss / 1024 / 1024 / 1024
     progress.set_postfix({
         'memory_usage': '{:.2f}'.format(memory_usage).zfill(5) + 'GB',
         'execution_providers': roop.globals.execution_providers,
@@ -1,6 +1,9 @@
+import os
+from contextlib import nullcontext
 from typing import Any, List, Callable
 import cv2
 import threading
+import torch
 from gfpgan.utils import GFPGANer
 
 import roop.globals
@@ -11,6 +14,7 @@ from roop.typing import Frame, Face
 from roop.utilities import conditional_download, resolve_relative_path, is_image, is_video
 
 FACE_ENHANCER = None
+# a single permit: GFPGANer.enhance mutates shared face_helper state
 THREAD_SEMAPHORE = threading.Semaphore()
 THREAD_LOCK = threading.Lock()
 NAME = 'ROOP.FACE-ENHANCER'
@@ -21,6 +25,9 @@ def get_face_enhancer() -> Any:
 
     with THREAD_LOCK:
         if FACE_ENHANCER is None:
+            if get_device() == 'cuda':
+                # variable face-crop sizes make cudnn re-benchmark on every new shape
+                torch.backends.cudnn.benchmark = False
             model_path = resolve_relative_path('../models/GFPGANv1.4.pth')
             # todo: set models path -> https://github.com/TencentARC/GFPGAN/issues/399
             FACE_ENHANCER = GFPGANer(model_path=model_path, upscale=1, device=get_device())
@@ -35,6 +42,13 @@ def get_device() -> str:
     return 'cpu'
 
 
+def conditional_autocast() -> Any:
+    # mixed precision roughly halves enhancer inference time on cuda
+    if get_device() == 'cuda':
+        return torch.autocast('cuda')
+    return nullcontext()
+
+
 def clear_face_enhancer() -> None:
     global FACE_ENHANCER
 
@@ -55,7 +69,9 @@ def pre_start() -> bool:
 
 
 def post_process() -> None:
-    clear_face_enhancer()
+    # keep the model resident so repeated runs skip the reload from disk
+    if os.environ.get('ROOP_RELEASE_MODELS') == '1':
+        clear_face_enhancer()
 
 
 def enhance_face(target_face: Face, temp_frame: Frame) -> Frame:
@@ -69,10 +85,11 @@ def enhance_face(target_face: Face, temp_frame: Frame) -> Frame:
     temp_face = temp_frame[start_y:end_y, start_x:end_x]
     if temp_face.size:
         with THREAD_SEMAPHORE:
-            _, _, temp_face = get_face_enhancer().enhance(
-                temp_face,
-                paste_back=True
-            )
+            with torch.inference_mode(), conditional_autocast():
+                _, _, temp_face = get_face_enhancer().enhance(
+                    temp_face,
+                    paste_back=True
+                )
         temp_frame[start_y:end_y, start_x:end_x] = temp_face
     return temp_frame
 
@@ -85,13 +102,12 @@ def process_frame(source_face: Face, reference_face: Face, temp_frame: Frame) ->
     return temp_frame
 
 
+def process_frame_batch(source_face: Face, reference_face: Face, temp_frames: List[Frame]) -> List[Frame]:
+    return [process_frame(source_face, reference_face, temp_frame) for temp_frame in temp_frames]
+
+
 def process_frames(source_path: str, temp_frame_paths: List[str], update: Callable[[], None]) -> None:
-    for temp_frame_path in temp_frame_paths:
-        temp_frame = cv2.imread(temp_frame_path)
-        result = process_frame(None, None, temp_frame)
-        cv2.imwrite(temp_frame_path, result)
-        if update:
-            update()
+    roop.processors.frame.core.pipeline_frames(temp_frame_paths, lambda temp_frames: [process_frame(None, None, temp_frame) for temp_frame in temp_frames], update)
 
 
 def process_image(source_path: str, target_path: str, output_path: str) -> None:
@@ -1,17 +1,25 @@
-from typing import Any, List, Callable
+import os
+from typing import Any, List, Callable, Tuple
 import cv2
 import insightface
+import numpy
+import onnxruntime
 import threading
+from insightface.utils import face_align
 
 import roop.globals
 import roop.processors.frame.core
 from roop.core import update_status
-from roop.face_analyser import get_one_face, get_many_faces, find_similar_face
+from roop.face_analyser import get_one_face, get_many_faces, get_source_face, find_similar_face
 from roop.face_reference import get_face_reference, set_face_reference, clear_face_reference
 from roop.typing import Face, Frame
 from roop.utilities import conditional_download, resolve_relative_path, is_image, is_video
 
 FACE_SWAPPER = None
+SOURCE_LATENT = None
+SOURCE_LATENT_FACE = None
+SOURCE_LATENT_ORTVALUE = None
+SOURCE_LATENT_ORTVALUE_SOURCE = None
 THREAD_LOCK = threading.Lock()
 NAME = 'ROOP.FACE-SWAPPER'
 
@@ -42,7 +50,7 @@ def pre_start() -> bool:
     if not is_image(roop.globals.source_path):
         update_status('Select an image for source path.', NAME)
         return False
-    elif not get_one_face(cv2.imread(roop.globals.source_path)):
+    elif not get_source_face(roop.globals.source_path):
         update_status('No face in source path detected.', NAME)
         return False
     if not is_image(roop.globals.target_path) and not is_video(roop.globals.target_path):
@@ -52,7 +60,9 @@ def pre_start() -> bool:
 
 
 def post_process() -> None:
-    clear_face_swapper()
+    # keep the model resident so repeated runs skip the reload from disk
+    if os.environ.get('ROOP_RELEASE_MODELS') == '1':
+        clear_face_swapper()
     clear_face_reference()
 
 
@@ -60,6 +70,77 @@ def swap_face(source_face: Face, target_face: Face, temp_frame: Frame) -> Frame:
     return get_face_swapper().get(temp_frame, target_face, source_face, paste_back=True)
 
 
+def get_source_latent(source_face: Face) -> numpy.ndarray:
+    global SOURCE_LATENT, SOURCE_LATENT_FACE
+
+    if SOURCE_LATENT is None or SOURCE_LATENT_FACE is not source_face:
+        latent = source_face.normed_embedding.reshape((1, -1))
+        latent = numpy.dot(latent, get_face_swapper().emap)
+        latent /= numpy.linalg.norm(latent)
+        SOURCE_LATENT = latent
+        SOURCE_LATENT_FACE = source_face
+    return SOURCE_LATENT
+
+
+def get_latent_ortvalue(latent: numpy.ndarray) -> Any:
+    global SOURCE_LATENT_ORTVALUE, SOURCE_LATENT_ORTVALUE_SOURCE
+
+    if SOURCE_LATENT_ORTVALUE is None or SOURCE_LATENT_ORTVALUE_SOURCE is not latent:
+        SOURCE_LATENT_ORTVALUE = onnxruntime.OrtValue.ortvalue_from_numpy(numpy.ascontiguousarray(latent), 'cuda', 0)
+        SOURCE_LATENT_ORTVALUE_SOURCE = latent
+    return SOURCE_LATENT_ORTVALUE
+
+
+def run_swapper_session(face_swapper: Any, blob: numpy.ndarray, latent: numpy.ndarray) -> numpy.ndarray:
+    # inputs carry a single face to satisfy the static [1, ...] graph shapes;
+    # the latent is uploaded once per source and stays device-resident, so
+    # only the per-face blob travels to the gpu on each call
+    if 'CUDAExecutionProvider' in roop.globals.execution_providers:
+        binding = face_swapper.session.io_binding()
+        binding.bind_cpu_input(face_swapper.input_names[0], numpy.ascontiguousarray(blob))
+        binding.bind_ortvalue_input(face_swapper.input_names[1], get_latent_ortvalue(latent))
+        binding.bind_output(face_swapper.output_names[0], 'cuda')
+        face_swapper.session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()[0]
+    return face_swapper.session.run(face_swapper.output_names, {face_swapper.input_names[0]: blob, face_swapper.input_names[1]: latent})[0]
+
+
+def swap_faces_batch(source_face: Face, swaps: List[Tuple[int, Face]], temp_frames: List[Frame]) -> None:
+    # the pinned inswapper graph declares static [1, ...] input shapes, so the
+    # session runs once per face while alignment and the latent stay shared
+    face_swapper = get_face_swapper()
+    latent = get_source_latent(source_face)
+    for frame_index, target_face in swaps:
+        aligned_face, matrix = face_align.norm_crop2(temp_frames[frame_index], target_face.kps, face_swapper.input_size[0])
+        blob = cv2.dnn.blobFromImage(aligned_face, 1.0 / face_swapper.input_std, face_swapper.input_size, (face_swapper.input_mean, face_swapper.input_mean, face_swapper.input_mean), swapRB=True)
+        prediction = run_swapper_session(face_swapper, blob, latent)[0]
+        swapped_face = numpy.clip(255 * prediction.transpose((1, 2, 0)), 0, 255).astype(numpy.uint8)[:, :, ::-1]
+        temp_frames[frame_index] = paste_back(temp_frames[frame_index], swapped_face, matrix)
+
+
+def paste_back(temp_frame: Frame, swapped_face: Frame, matrix: Any) -> Frame:
+    inverse_matrix = cv2.invertAffineTransform(matrix)
+    frame_height, frame_width = temp_frame.shape[:2]
+    face_height, face_width = swapped_face.shape[:2]
+    swapped_face = cv2.warpAffine(swapped_face, inverse_matrix, (frame_width, frame_height), borderValue=0.0)
+    mask = numpy.full((face_height, face_width), 255, dtype=numpy.float32)
+    mask = cv2.warpAffine(mask, inverse_matrix, (frame_width, frame_height), borderValue=0.0)
+    mask[mask > 20] = 255
+    mask_positions = numpy.where(mask == 255)
+    if not mask_positions[0].size:
+        return temp_frame
+    mask_height = numpy.max(mask_positions[0]) - numpy.min(mask_positions[0])
+    mask_width = numpy.max(mask_positions[1]) - numpy.min(mask_positions[1])
+    mask_size = int(numpy.sqrt(mask_height * mask_width))
+    kernel_size = max(mask_size // 10, 10)
+    mask = cv2.erode(mask, numpy.ones((kernel_size, kernel_size), numpy.uint8), iterations=1)
+    blur_size = max(mask_size // 20, 5) * 2 + 1
+    mask = cv2.GaussianBlur(mask, (blur_size, blur_size), 0)
+    mask = numpy.expand_dims(mask / 255, axis=-1)
+    merged_frame = mask * swapped_face.astype(numpy.float32) + (1 - mask) * temp_frame.astype(numpy.float32)
+    return merged_frame.astype(numpy.uint8)
+
+
 def process_frame(source_face: Face, reference_face: Face, temp_frame: Frame) -> Frame:
     if roop.globals.many_faces:
         many_faces = get_many_faces(temp_frame)
@@ -73,19 +154,32 @@ def process_frame(source_face: Face, reference_face: Face, temp_frame: Frame) ->
     return temp_frame
 
 
+def process_frame_batch(source_face: Face, reference_face: Face, temp_frames: List[Frame]) -> List[Frame]:
+    swaps = []
+    for frame_index, temp_frame in enumerate(temp_frames):
+        if roop.globals.many_faces:
+            many_faces = get_many_faces(temp_frame)
+            if many_faces:
+                for target_face in many_faces:
+                    swaps.append((frame_index, target_face))
+        else:
+            target_face = find_similar_face(temp_frame, reference_face)
+            if target_face:
+                swaps.append((frame_index, target_face))
+    if swaps:
+        swap_faces_batch(source_face, swaps, temp_frames)
+    return temp_frames
+
+
 def process_frames(source_path: str, temp_frame_paths: List[str], update: Callable[[], None]) -> None:
-    source_face = get_one_face(cv2.imread(source_path))
+    source_face = get_source_face(source_path)
     reference_face = None if roop.globals.many_faces else get_face_reference()
-    for temp_frame_path in temp_frame_paths:
-        temp_frame = cv2.imread(temp_frame_path)
-        result = process_frame(source_face, reference_face, temp_frame)
-        cv2.imwrite(temp_frame_path, result)
-        if update:
-            update()
+    batch_size = roop.processors.frame.core.suggest_batch_size()
+    roop.processors.frame.core.pipeline_frames(temp_frame_paths, lambda temp_frames: process_frame_batch(source_face, reference_face, temp_frames), update, batch_size)
 
 
 def process_image(source_path: str, target_path: str, output_path: str) -> None:
-    source_face = get_one_face(cv2.imread(source_path))
+    source_face = get_source_face(source_path)
     target_frame = cv2.imread(target_path)
     reference_face = None if roop.globals.many_faces else get_one_face(target_frame, roop.globals.reference_face_position)
     result = process_frame(source_face, reference_face, target_frame)
@@ -9,7 +9,7 @@ from PIL import Image, ImageOps
 
 import roop.globals
 import roop.metadata
-from roop.face_analyser import get_one_face
+from roop.face_analyser import get_one_face, get_source_face
 from roop.capturer import get_video_frame, get_video_frame_total
 from roop.face_reference import get_face_reference, set_face_reference, clear_face_reference
 from roop.predictor import predict_frame, clear_predictor
@@ -252,7 +252,7 @@ def update_preview(frame_number: int = 0) -> None:
         temp_frame = get_video_frame(roop.globals.target_path, frame_number)
         if predict_frame(temp_frame):
             sys.exit()
-        source_face = get_one_face(cv2.imread(roop.globals.source_path))
+        source_face = get_source_face(roop.globals.source_path)
         if not get_face_reference():
             reference_frame = get_video_frame(roop.globals.target_path, roop.globals.reference_frame_number)
             reference_face = get_one_face(reference_frame, roop.globals.reference_face_position)
@@ -7,16 +7,19 @@ import ssl
 import subprocess
 import urllib
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
+import numpy
 from tqdm import tqdm
 
 import roop.globals
 
 TEMP_DIRECTORY = 'temp'
 TEMP_VIDEO_FILE = 'temp.mp4'
+PLATFORM_NAME = platform.system().lower()
+FFMPEG_ENCODERS: Optional[str] = None
 
 # monkey patch ssl for mac
-if platform.system().lower() == 'darwin':
+if PLATFORM_NAME == 'darwin':
     ssl._create_default_https_context = ssl._create_unverified_context
 
 
@@ -31,6 +34,27 @@ def run_ffmpeg(args: List[str]) -> bool:
     return False
 
 
+def get_ffmpeg_encoders() -> str:
+    global FFMPEG_ENCODERS
+
+    if FFMPEG_ENCODERS is None:
+        try:
+            FFMPEG_ENCODERS = subprocess.check_output(['ffmpeg', '-hide_banner', '-encoders'], stderr=subprocess.STDOUT).decode()
+        except Exception:
+            FFMPEG_ENCODERS = ''
+    return FFMPEG_ENCODERS
+
+
+def resolve_output_video_encoder() -> str:
+    # an explicitly chosen encoder always wins; the default upgrades to nvenc
+    # when inference already runs on cuda and ffmpeg supports it
+    if roop.globals.output_video_encoder:
+        return roop.globals.output_video_encoder
+    if 'CUDAExecutionProvider' in roop.globals.execution_providers and 'h264_nvenc' in get_ffmpeg_encoders():
+        return 'h264_nvenc'
+    return 'libx264'
+
+
 def detect_fps(target_path: str) -> float:
     command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=r_frame_rate', '-of', 'default=noprint_wrappers=1:nokey=1', target_path]
     output = subprocess.check_output(command).decode().strip().split('/')
@@ -48,14 +72,50 @@ def extract_frames(target_path: str, fps: float = 30) -> bool:
     return run_ffmpeg(['-hwaccel', 'auto', '-i', target_path, '-q:v', str(temp_frame_quality), '-pix_fmt', 'rgb24', '-vf', 'fps=' + str(fps), os.path.join(temp_directory_path, '%04d.' + roop.globals.temp_frame_format)])
 
 
+def get_video_resolution(target_path: str) -> Tuple[int, int]:
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height', '-of', 'csv=s=x:p=0', target_path]
+    output = subprocess.check_output(command).decode().strip().split('x')
+    return int(output[0]), int(output[1])
+
+
+def iter_raw_frames(target_path: str, fps: float = 30) -> Iterator[numpy.ndarray]:
+    width, height = get_video_resolution(target_path)
+    frame_size = width * height * 3
+    commands = ['ffmpeg', '-hide_banner', '-loglevel', roop.globals.log_level, '-hwaccel', 'auto', '-i', target_path, '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-vf', 'fps=' + str(fps), 'pipe:1']
+    process = subprocess.Popen(commands, stdout=subprocess.PIPE, bufsize=frame_size)
+    try:
+        while True:
+            chunk = process.stdout.read(frame_size)
+            if len(chunk) < frame_size:
+                break
+            yield numpy.frombuffer(chunk, dtype=numpy.uint8).reshape(height, width, 3).copy()
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def open_video_writer(target_path: str, width: int, height: int, fps: float = 30) -> subprocess.Popen[bytes]:
+    temp_output_path = get_temp_output_path(target_path)
+    output_video_encoder = resolve_output_video_encoder()
+    output_video_quality = (roop.globals.output_video_quality + 1) * 51 // 100
+    commands = ['ffmpeg', '-hide_banner', '-loglevel', roop.globals.log_level, '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', str(width) + 'x' + str(height), '-r', str(fps), '-i', 'pipe:0', '-c:v', output_video_encoder]
+    if output_video_encoder in ['libx264', 'libx265', 'libvpx']:
+        commands.extend(['-crf', str(output_video_quality)])
+    if output_video_encoder in ['h264_nvenc', 'hevc_nvenc']:
+        commands.extend(['-cq', str(output_video_quality)])
+    commands.extend(['-pix_fmt', 'yuv420p', '-vf', 'colorspace=bt709:iall=bt601-6-625:fast=1', '-y', temp_output_path])
+    return subprocess.Popen(commands, stdin=subprocess.PIPE)
+
+
 def create_video(target_path: str, fps: float = 30) -> bool:
     temp_output_path = get_temp_output_path(target_path)
     temp_directory_path = get_temp_directory_path(target_path)
+    output_video_encoder = resolve_output_video_encoder()
     output_video_quality = (roop.globals.output_video_quality + 1) * 51 // 100
-    commands = ['-hwaccel', 'auto', '-r', str(fps), '-i', os.path.join(temp_directory_path, '%04d.' + roop.globals.temp_frame_format), '-c:v', roop.globals.output_video_encoder]
-    if roop.globals.output_video_encoder in ['libx264', 'libx265', 'libvpx']:
+    commands = ['-hwaccel', 'auto', '-r', str(fps), '-i', os.path.join(temp_directory_path, '%04d.' + roop.globals.temp_frame_format), '-c:v', output_video_encoder]
+    if output_video_encoder in ['libx264', 'libx265', 'libvpx']:
         commands.extend(['-crf', str(output_video_quality)])
-    if roop.globals.output_video_encoder in ['h264_nvenc', 'hevc_nvenc']:
+    if output_video_encoder in ['h264_nvenc', 'hevc_nvenc']:
         commands.extend(['-cq', str(output_video_quality)])
     commands.extend(['-pix_fmt', 'yuv420p', '-vf', 'colorspace=bt709:iall=bt601-6-625:fast=1', '-y', temp_output_path])
     return run_ffmpeg(commands)
@@ -108,9 +168,11 @@ def move_temp(target_path: str, output_path: str) -> None:
 
 def clean_temp(target_path: str) -> None:
     temp_directory_path = get_temp_directory_path(target_path)
-    parent_directory_path = os.path.dirname(temp_directory_path)
-    if not roop.globals.keep_frames and os.path.isdir(temp_directory_path):
+    if not os.path.isdir(temp_directory_path):
+        return
+    if not roop.globals.keep_frames:
         shutil.rmtree(temp_directory_path)
+    parent_directory_path = os.path.dirname(temp_directory_path)
     if os.path.exists(parent_directory_path) and not os.listdir(parent_directory_path):
         os.rmdir(parent_directory_path)
 